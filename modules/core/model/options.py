@@ -67,6 +67,9 @@ class WorkflowOptions:
         self.none = none
 
         self._colors = None
+        self._labels = None
+        self._lookup = None
+        self._options = None
 
         self._keys = [o[0] for o in theset]
         if selectable:
@@ -77,7 +80,7 @@ class WorkflowOptions:
     # -------------------------------------------------------------------------
     def selectable(self, values=False, current_value=None):
         """
-            Produces a list of selectable options for use with IS_IN_SET
+            Produces the selectable options for use with IS_IN_SET
 
             Args:
                 values: which values to use
@@ -86,6 +89,13 @@ class WorkflowOptions:
                         - False for all possible options
                 current_value: the current value of the field, to be included
                                in the selectable options
+
+            Returns:
+                a tuple of tuples ((value, T(label)), ...)
+
+            Note:
+                - the options are cached per translator, and returned
+                  as tuple so that the cached options cannot be modified
         """
 
         if values is False:
@@ -93,14 +103,25 @@ class WorkflowOptions:
         elif values is True:
             selectable = self._selectable
         elif isinstance(values, (tuple, list, set)):
-            selectable = list(values)
+            selectable = values
         else:
-            selectable = []
+            selectable = ()
 
-        if current_value and current_value not in selectable:
-            selectable = [current_value] + selectable
+        key = frozenset(selectable)
+        if current_value and current_value not in key:
+            key = key | {current_value}
 
-        return [o for o in self.labels() if o[0] in selectable]
+        # Cache per translator and set of selectable values
+        T = current.T
+        cached = self._options
+        if cached is None or cached[0] is not T:
+            cached = self._options = (T, {})
+        options = cached[1].get(key)
+        if options is None:
+            options = tuple(o for o in self.labels() if o[0] in key)
+            cached[1][key] = options
+
+        return options
 
     # -------------------------------------------------------------------------
     @property
@@ -128,12 +149,50 @@ class WorkflowOptions:
             The (localized) option labels, for representation
 
             Returns:
-                a list of tuples [(value, T(label)), ...]
+                a tuple of tuples ((value, T(label)), ...)
+
+            Note:
+                - the labels are cached per translator (=per request),
+                  and returned as tuple so that they cannot be modified
+        """
+
+        T = current.T
+
+        # Cache as tuple (translator, labels), so that concurrent
+        # requests never see labels bound to another translator
+        cached = self._labels
+        if cached is None or cached[0] is not T:
+            labels = tuple((o[0], T(o[1])) for o in self.theset)
+            self._labels = (T, labels)
+        else:
+            labels = cached[1]
+
+        return labels
+
+    # -------------------------------------------------------------------------
+    def lookup(self):
+        """
+            The (localized) option labels as lookup table, for
+            representation
+
+            Returns:
+                a dict {value: T(label)}
+
+            Note:
+                - cached per translator like labels(); the returned dict
+                  is shared, so it must not be modified by the caller
         """
 
         T = current.T
 
-        return [(o[0], T(o[1])) for o in self.theset]
+        cached = self._lookup
+        if cached is None or cached[0] is not T:
+            lookup = dict(self.labels())
+            self._lookup = (T, lookup)
+        else:
+            lookup = cached[1]
+
+        return lookup
 
     # -------------------------------------------------------------------------
     @property
@@ -167,27 +226,29 @@ class WorkflowOptions:
 
         none = self.none
 
-        colors = self.colors
         icons = self.icons
         css_classes = self.css_classes
 
+        # Precompute icon and CSS class for each value
+        styles = {}
+        for value, color in self.colors.items():
+            css_class = css_classes.get(color)
+            styles[value] = (icons.get(color),
+                             "workflow-options %s" % css_class if css_class else "workflow-options",
+                             )
+        default = (None, "workflow-options")
+
         def represent(value, row=None):
 
             if value is None and none:
                 value = none
 
-            label = DIV(_class="workflow-options")
-
-            color = colors.get(value)
-            if color:
-                icon = icons.get(color)
-                if icon:
-                    label.append(I(_class=icon))
-                css_class = css_classes.get(color)
-                if css_class:
-                    label.add_class(css_class)
+            icon, css_class = styles.get(value, default)
 
-            label.append(dict(self.labels()).get(value, "-"))
+            label = DIV(_class=css_class)
+            if icon:
+                label.append(I(_class=icon))
+            label.append(self.lookup().get(value, "-"))
 
             return label
 
@@ -208,7 +269,7 @@ class WorkflowOptions:
                                    )
 
         def represent(value, row=None):
-            inst.options = dict(self.labels())
+            inst.options = self.lookup()
             return inst(value, row=row)
 
         return represent
@@ -15,7 +15,7 @@ from core import FS, IS_ONE_OF
 from s3dal import original_tablename
 
 from templates.RLPPTM.rlpgeonames import rlp_GeoNames
-from .helpers import restrict_data_formats
+from .helpers import get_logged_in_person, has_role, restrict_data_formats
 
 LSJV = "Landesamt für Soziales, Jugend und Versorgung"
 
@@ -585,8 +585,8 @@ def config(settings):
 
         s3 = current.response.s3
 
-        is_event_manager = auth.s3_has_role("EVENT_MANAGER")
-        is_relief_provider = auth.s3_has_role("RELIEF_PROVIDER")
+        is_event_manager = has_role("EVENT_MANAGER")
+        is_relief_provider = has_role("RELIEF_PROVIDER")
         org_role = is_event_manager or is_relief_provider
 
         # Custom prep
@@ -965,7 +965,7 @@ def config(settings):
         record = r.record
         case_file = r.tablename == "pr_person" and record
         ours = r.function == "case_activity" and \
-                             current.auth.s3_has_roles(("RELIEF_PROVIDER", "CASE_MANAGER"))
+                             has_role("RELIEF_PROVIDER", "CASE_MANAGER")
 
         s3 = current.response.s3
         crud_strings = s3.crud_strings
@@ -1012,24 +1012,25 @@ def config(settings):
                                         show_map = False,
                                         )
 
+        crud_form = s3db.get_config("br_case_activity", "crud_form")
         if case_file or ours:
             # Custom form to change field order
-            from core import S3SQLCustomForm
-            crud_fields = ["person_id",
-                           "priority",
-                           "date",
-                           "need_id",
-                           "subject",
-                           "need_details",
-                           "location_id",
-                           "activity_details",
-                           "outcome",
-                           "status_id",
-                           "comments",
-                           ]
-            s3db.configure("br_case_activity",
-                           crud_form = S3SQLCustomForm(*crud_fields),
-                           )
+            # - not needed for non-interactive formats
+            if r.interactive:
+                from core import S3SQLCustomForm
+                crud_fields = ["person_id",
+                               "priority",
+                               "date",
+                               "need_id",
+                               "subject",
+                               "need_details",
+                               "location_id",
+                               "activity_details",
+                               "outcome",
+                               "status_id",
+                               "comments",
+                               ]
+                crud_form = S3SQLCustomForm(*crud_fields)
             # Subheadings for CRUD form
             subheadings = {"priority": T("Need Details"),
                            "location_id": T("Need Location"),
@@ -1044,6 +1045,7 @@ def config(settings):
                            "status_id": T("Status"),
                            }
         s3db.configure("br_case_activity",
+                       crud_form = crud_form,
                        subheadings = subheadings,
                        # Default sort order: newest first
                        orderby = "br_case_activity.date desc, br_case_activity.created_on desc",
@@ -1075,8 +1077,8 @@ def config(settings):
 
         s3 = current.response.s3
 
-        is_event_manager = auth.s3_has_role("EVENT_MANAGER")
-        is_case_manager = auth.s3_has_roles(("RELIEF_PROVIDER", "CASE_MANAGER"))
+        is_event_manager = has_role("EVENT_MANAGER")
+        is_case_manager = has_role("RELIEF_PROVIDER", "CASE_MANAGER")
 
         # Custom prep
         standard_prep = s3.prep
@@ -1107,7 +1109,7 @@ def config(settings):
                     insertable = False
                 else:
                     # Set default beneficiary + hide it
-                    logged_in_person = auth.s3_logged_in_person()
+                    logged_in_person = get_logged_in_person()
                     field.default = logged_in_person
                     field.readable = False
                     if not r.record:
@@ -1172,45 +1174,48 @@ def config(settings):
                         field = table.person_id
                         field.represent = s3db.pr_PersonRepresent(show_link=True)
 
-                # Filters
-                from core import DateFilter, \
-                                 TextFilter, \
-                                 LocationFilter, \
-                                 OptionsFilter, \
-                                 get_filter_options
-                filter_widgets = [
-                    TextFilter(["subject",
-                                "need_details",
-                                ],
-                               label = T("Search"),
-                               ),
-                    OptionsFilter("need_id",
-                                  options = lambda: \
-                                            get_filter_options("br_need",
-                                                               translate = True,
-                                                           ),
-                                    ),
-                    LocationFilter("location_id",
-                                   label = T("Place"),
-                                   levels = ("L2", "L3"),
+                # Filters (only needed for interactive views and filter options)
+                if r.interactive or r.method == "filter":
+                    from core import DateFilter, \
+                                     TextFilter, \
+                                     LocationFilter, \
+                                     OptionsFilter, \
+                                     get_filter_options
+                    filter_widgets = [
+                        TextFilter(["subject",
+                                    "need_details",
+                                    ],
+                                   label = T("Search"),
                                    ),
-                    DateFilter("date",
-                               hidden = True,
-                               ),
-                    ]
-                if mine or is_event_manager:
-                    filter_widgets.append(
-                        OptionsFilter("status_id",
+                        OptionsFilter("need_id",
                                       options = lambda: \
-                                                get_filter_options("br_case_activity_status",
+                                                get_filter_options("br_need",
                                                                    translate = True,
-                                                                   ),
-                                      hidden = True,
-                                      ))
+                                                               ),
+                                        ),
+                        LocationFilter("location_id",
+                                       label = T("Place"),
+                                       levels = ("L2", "L3"),
+                                       ),
+                        DateFilter("date",
+                                   hidden = True,
+                                   ),
+                        ]
+                    if mine or is_event_manager:
+                        filter_widgets.append(
+                            OptionsFilter("status_id",
+                                          options = lambda: \
+                                                    get_filter_options("br_case_activity_status",
+                                                                       translate = True,
+                                                                       ),
+                                          hidden = True,
+                                          ))
 
-                resource.configure(filter_widgets = filter_widgets,
-                                   list_fields = list_fields,
-                                   )
+                    resource.configure(filter_widgets = filter_widgets,
+                                       list_fields = list_fields,
+                                       )
+                else:
+                    resource.configure(list_fields = list_fields)
 
                 # Report options
                 if r.method == "report":
@@ -1645,7 +1650,7 @@ def config(settings):
 
             resource = r.resource
 
-            is_org_group_admin = auth.s3_has_role("ORG_GROUP_ADMIN")
+            is_org_group_admin = has_role("ORG_GROUP_ADMIN")
             mine = False
 
             if not is_org_group_admin:
@@ -1799,19 +1804,15 @@ def config(settings):
         db = current.db
         s3db = current.s3db
 
-        # Get the record
+        # Assign an ID if the record doesn't have one yet
+        # - conditional update rather than select+update, to save
+        #   a DB round-trip per record in bulk imports
         table = s3db.pr_person
-        query = (table.id == record_id)
-        record = db(query).select(table.id,
-                                  table.pe_label,
-                                  limitby = (0, 1),
-                                  ).first()
-        if not record:
-            return
-
-        if not record.pe_label:
-            record.update_record(pe_label="C-%07d" % record_id)
-            s3db.update_super(table, record)
+        query = (table.id == record_id) & \
+                ((table.pe_label == None) | (table.pe_label == ""))
+        updated = db(query).update(pe_label="C-%07d" % record_id)
+        if updated:
+            s3db.update_super(table, {"id": record_id})
 
     # -------------------------------------------------------------------------
     def customise_pr_person_resource(r, tablename):
@@ -1924,7 +1925,7 @@ def config(settings):
                     # Configure case.organisation_id
                     field = ctable.organisation_id
                     field.comment = None
-                    if not current.auth.s3_has_role("RELIEF_PROVIDER"):
+                    if not has_role("RELIEF_PROVIDER"):
                         ctable = s3db.br_case
                         field.default = settings.get_org_default_organisation()
                         field.readable = field.writable = bool(field.default)
@@ -51,6 +51,36 @@ def get_role_realms(role):
 
     return role_realms
 
+# =============================================================================
+def has_role(*roles):
+    """
+        Check whether the current user has any of the given roles, with
+        the result cached for the duration of the request (so that the
+        same check in prep, resource customisation and rheader does not
+        have to be repeated)
+
+        Args:
+            roles: the role UIDs
+
+        Returns:
+            True|False
+    """
+
+    s3 = current.response.s3
+
+    checked = s3.rlpcm_roles
+    if checked is None:
+        checked = s3.rlpcm_roles = {}
+
+    if roles not in checked:
+        auth = current.auth
+        if len(roles) == 1:
+            checked[roles] = auth.s3_has_role(roles[0])
+        else:
+            checked[roles] = auth.s3_has_roles(roles)
+
+    return checked[roles]
+
 # =============================================================================
 def get_managed_orgs(role):
     """
@@ -103,6 +133,23 @@ def get_current_events(record):
                             )
     return [row.id for row in rows]
 
+# =============================================================================
+def get_logged_in_person():
+    """
+        The person record ID of the current user, looked up only
+        once per request
+
+        Returns:
+            the person ID, or None if the user is not logged in or
+            has no person record
+    """
+
+    s3 = current.response.s3
+    if "rlpcm_logged_in_person" not in s3:
+        s3.rlpcm_logged_in_person = current.auth.s3_logged_in_person()
+
+    return s3.rlpcm_logged_in_person
+
 # =============================================================================
 def get_current_location(person_id=None):
     """
@@ -117,7 +164,7 @@ def get_current_location(person_id=None):
     """
 
     if not person_id:
-        person_id = current.auth.s3_logged_in_person()
+        person_id = get_logged_in_person()
 
     from core import S3Trackable
     trackable = S3Trackable(tablename="pr_person", record_id=person_id)
@@ -152,11 +199,10 @@ def get_offer_filters(person_id=None):
     """
 
     db = current.db
-    auth = current.auth
     s3db = current.s3db
 
     if not person_id:
-        person_id = auth.s3_logged_in_person()
+        person_id = get_logged_in_person()
     if not person_id:
         return None
 
@@ -772,6 +818,12 @@ class ServiceListRepresent(S3Represent):
         return html
 
 # =============================================================================
+ALLOWED_FORMATS = frozenset(("html", "iframe", "popup", "aadata", "plain",
+                             "geojson", "pdf", "xlsx",
+                             ))
+ALLOWED_FORMATS_JSON = ALLOWED_FORMATS | {"json"}
+ALLOWED_FORMATS_S3JSON = ALLOWED_FORMATS | {"s3json"}
+
 def restrict_data_formats(r):
     """
         Restrict data exports (prevent S3XML/S3JSON of records)
@@ -782,11 +834,13 @@ def restrict_data_formats(r):
 
     settings = current.deployment_settings
 
-    allowed = ("html", "iframe", "popup", "aadata", "plain", "geojson", "pdf", "xlsx")
-    if r.method in ("report", "timeplot", "filter"):
-        allowed += ("json",)
-    if r.method == "options":
-        allowed += ("s3json",)
+    method = r.method
+    if method in ("report", "timeplot", "filter"):
+        allowed = ALLOWED_FORMATS_JSON
+    elif method == "options":
+        allowed = ALLOWED_FORMATS_S3JSON
+    else:
+        allowed = ALLOWED_FORMATS
     settings.ui.export_formats = ("pdf", "xlsx")
     if r.representation not in allowed:
         r.error(403, current.ERROR.NOT_PERMITTED)
@@ -8,6 +8,8 @@ from gluon import current, URL, A, SPAN
 
 from core import S3ResourceHeader, s3_rheader_resource, s3_fullname
 
+from .helpers import has_role
+
 # =============================================================================
 def rlpcm_br_rheader(r, tabs=None):
     """ BR Resource Headers """
@@ -238,7 +240,7 @@ def rlpcm_org_rheader(r, tabs=None):
         if tablename == "org_organisation":
 
             auth = current.auth
-            is_org_group_admin = auth.s3_has_role("ORG_GROUP_ADMIN")
+            is_org_group_admin = has_role("ORG_GROUP_ADMIN")
 
             if not tabs:
                 tabs = [(T("Organization"), None),
@@ -29,6 +29,54 @@ rstable = s3db.cr_reception_center_status
 IMPORT_XSLT_FOLDER = os.path.join(request.folder, "static", "formats", "s3csv")
 TEMPLATE_FOLDER = os.path.join(request.folder, "modules", "templates", "GIMS")
 
+# Realm fix
+def fix_realms(table, parent, key):
+    """
+        Set the realm entity for all records in table that have none,
+        inheriting it from the parent record (see realm_entity in
+        customise/auth.py)
+
+        Args:
+            table: the Table
+            parent: the parent Table
+            key: the name of the foreign key in table referencing parent
+
+        Returns:
+            number of records updated
+    """
+
+    query = (table.realm_entity == None) & \
+            (table.deleted == False)
+    left = parent.on(parent.id == table[key])
+    rows = db(query).select(table.id,
+                            parent.id,
+                            parent.realm_entity,
+                            left = left,
+                            )
+
+    # Group the records by the realm of their parent
+    realms = {}
+    orphans = []
+    for row in rows:
+        record_id = row[table.id]
+        if row[parent.id] is None:
+            # Parent not found => use default realm rules
+            orphans.append(record_id)
+        else:
+            realm_entity = row[parent.realm_entity]
+            if realm_entity:
+                realms.setdefault(realm_entity, []).append(record_id)
+
+    # Update all records with the same realm in one statement
+    updated = 0
+    for realm_entity, record_ids in realms.items():
+        updated += db(table.id.belongs(record_ids)).update(realm_entity=realm_entity)
+    if orphans:
+        auth.set_realm_entity(table, orphans)
+        updated += len(orphans)
+
+    return updated
+
 # -----------------------------------------------------------------------------
 # Fix realms for shelter status and reception center status
 #
@@ -36,22 +84,8 @@ if not failed:
     info("Update realms for status records")
 
     updated = 0
-
-    query = (sstable.realm_entity == None) & \
-            (sstable.deleted == False)
-    before = db(query).count()
-    if before:
-        auth.set_realm_entity(sstable, query)
-        after = db(query).count()
-        updated += (before - after)
-
-    query = (rstable.realm_entity == None) & \
-            (rstable.deleted == False)
-    before = db(query).count()
-    if before:
-        auth.set_realm_entity(rstable, query)
-        after = db(query).count()
-        updated += (before - after)
+    updated += fix_realms(sstable, s3db.cr_shelter, "shelter_id")
+    updated += fix_realms(rstable, s3db.cr_reception_center, "facility_id")
 
     infoln("...done (%s records updated)" % updated)
 
@@ -30,52 +30,64 @@ rstable = s3db.cr_reception_center_status
 IMPORT_XSLT_FOLDER = os.path.join(request.folder, "static", "formats", "s3csv")
 TEMPLATE_FOLDER = os.path.join(request.folder, "modules", "templates", "GIMS")
 
+# Capacity migration
+def migrate_capacity(table):
+    """
+        Derive the new capacity numbers from the previous ones, using
+        a server-side UPDATE rather than one update_record per row
+
+        Args:
+            table: the table to migrate
+
+        Returns:
+            tuple (updated, unchanged) with the number of records
+            updated and the number of records already up-to-date
+    """
+
+    population = table.population
+
+    # Allocable capacity = previously allocatable capacity + population
+    allocable_capacity = table.allocatable_capacity + population
+
+    # Capacity must not be less than allocable capacity
+    capacity = (allocable_capacity > table.capacity).case(allocable_capacity,
+                                                          table.capacity,
+                                                          )
+
+    # NB all expressions refer to the values before the update
+    values = {"capacity": capacity,
+              "allocable_capacity": allocable_capacity,
+              "allocable_capacity_estimate": allocable_capacity,
+              "free_capacity": (capacity > population).case(capacity - population, 0),
+              "free_allocable_capacity": (allocable_capacity > population).case(allocable_capacity - population, 0),
+              "occupancy_rate": (allocable_capacity != 0).case(population * 100 / allocable_capacity, 100),
+              "utilization_rate": (capacity != 0).case(population * 100 / capacity, 100),
+              }
+
+    # Skip records that already have the correct values
+    outdated = None
+    for fn, expr in values.items():
+        field = table[fn]
+        q = (field == None) | (field != expr)
+        outdated = outdated | q if outdated is not None else q
+
+    query = (table.deleted == False)
+    total = db(query).count()
+    updated = db(query & outdated).update(modified_on = table.modified_on,
+                                          modified_by = table.modified_by,
+                                          **values)
+
+    return updated, total - updated
+
 # -----------------------------------------------------------------------------
 # Migrate capacity numbers
 #
 if not failed:
     info("Migrate capacity numbers of reception centers")
 
-    updated = 0
-
-    query = (rctable.deleted == False)
-    rows = db(query).select(rctable.id,
-                            rctable.capacity,
-                            rctable.population,
-                            rctable.allocatable_capacity,
-                            )
-    updated = 0
-    for row in rows:
-
-        capacity = row.capacity
-        population = row.population
-        allocatable_capacity = row.allocatable_capacity
-
-        allocable_capacity = allocatable_capacity + population
-        if allocable_capacity > capacity:
-            capacity = allocable_capacity
-
-        allocable_capacity_estimate = allocable_capacity
+    updated, unchanged = migrate_capacity(rctable)
 
-        free_capacity = max(0, capacity - population)
-        free_allocable_capacity = max(0, allocable_capacity - population)
-
-        occupancy_rate = population * 100 // allocable_capacity if allocable_capacity else 100
-        utilization_rate = population * 100 // capacity if capacity else 100
-
-        row.update_record(capacity = capacity,
-                          allocable_capacity_estimate = allocable_capacity_estimate,
-                          allocable_capacity = allocable_capacity,
-                          free_capacity = free_capacity,
-                          free_allocable_capacity = free_allocable_capacity,
-                          utilization_rate = utilization_rate,
-                          occupancy_rate = occupancy_rate,
-                          modified_on = rctable.modified_on,
-                          modified_by = rctable.modified_by,
-                          )
-        updated += 1
-
-    infoln("...done (%s records updated)" % updated)
+    infoln("...done (%s records updated, %s unchanged)" % (updated, unchanged))
 
 # -----------------------------------------------------------------------------
 # Migrate capacity history
@@ -83,46 +95,9 @@ if not failed:
 if not failed:
     info("Migrate capacity history")
 
-    updated = 0
-
-    query = (rstable.deleted == False)
-    rows = db(query).select(rstable.id,
-                            rstable.capacity,
-                            rstable.population,
-                            rstable.allocatable_capacity,
-                            )
-    updated = 0
-    for row in rows:
-
-        capacity = row.capacity
-        population = row.population
-        allocatable_capacity = row.allocatable_capacity
-
-        allocable_capacity = allocatable_capacity + population
-        if allocable_capacity > capacity:
-            capacity = allocable_capacity
-
-        allocable_capacity_estimate = allocable_capacity
-
-        free_capacity = max(0, capacity - population)
-        free_allocable_capacity = max(0, allocable_capacity - population)
-
-        occupancy_rate = population * 100 // allocable_capacity if allocable_capacity else 100
-        utilization_rate = population * 100 // capacity if capacity else 100
-
-        row.update_record(capacity = capacity,
-                          allocable_capacity = allocable_capacity,
-                          allocable_capacity_estimate = allocable_capacity_estimate,
-                          free_capacity = free_capacity,
-                          free_allocable_capacity = free_allocable_capacity,
-                          utilization_rate = utilization_rate,
-                          occupancy_rate = occupancy_rate,
-                          modified_on = rstable.modified_on,
-                          modified_by = rstable.modified_by,
-                          )
-        updated += 1
-
-    infoln("...done (%s records updated)" % updated)
+    updated, unchanged = migrate_capacity(rstable)
+
+    infoln("...done (%s records updated, %s unchanged)" % (updated, unchanged))
 
 # -----------------------------------------------------------------------------
 # Upgrade user roles
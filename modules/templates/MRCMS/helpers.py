@@ -526,19 +526,29 @@ def hr_details(record):
                   }
 
         Note:
-            all data returned are represented (not raw data)
+            - all data returned are represented (not raw data)
+            - results are cached for the duration of the request
     """
 
+    person_id = record.id
+    hr_id = current.request.get_vars.get("human_resource.id")
+
+    # Look up from request cache
+    s3 = current.response.s3
+    cache = s3.mrcms_hr_details
+    if cache is None:
+        cache = s3.mrcms_hr_details = {}
+    cache_key = (person_id, hr_id)
+    if cache_key in cache:
+        return cache[cache_key]
+
     db = current.db
     s3db = current.s3db
 
-    person_id = record.id
-
     # Get HR record
     htable = s3db.hrm_human_resource
     query = (htable.person_id == person_id)
 
-    hr_id = current.request.get_vars.get("human_resource.id")
     if hr_id:
         query &= (htable.id == hr_id)
     query &= (htable.deleted == False)
@@ -577,6 +587,8 @@ def hr_details(record):
                                                args = [organisation.id],
                                                ),
                                    )
+
+    cache[cache_key] = output
     return output
 
 # =============================================================================
@@ -6,7 +6,8 @@
 
 from gluon import current, A, I, URL, SPAN
 
-from core import S3ResourceHeader, s3_fullname, s3_rheader_resource
+from core import S3ResourceHeader, s3_avatar_represent, s3_fullname, \
+                 s3_rheader_resource
 
 from .helpers import hr_details
 
@@ -126,8 +127,10 @@ def dvr_rheader(r, tabs=None):
                                                    _style = "cursor:pointer",
                                                    )
 
-                    case_status = lambda row: case["dvr_case.status_id"]
-                    household_size = lambda row: case["dvr_case.household_size"]
+                    status_repr = case["dvr_case.status_id"]
+                    case_status = lambda row: status_repr
+                    household_size_repr = case["dvr_case.household_size"]
+                    household_size = lambda row: household_size_repr
 
                     # Represent shelter as link to shelter overview, if permitted
                     shelter_id = raw["cr_shelter_registration.shelter_id"]
@@ -138,8 +141,10 @@ def dvr_rheader(r, tabs=None):
                     else:
                         shelter = lambda row: shelter_name
 
-                    unit = lambda row: case["cr_shelter_registration.shelter_unit_id"]
-                    last_seen_on = lambda row: case["dvr_case.last_seen_on"]
+                    unit_repr = case["cr_shelter_registration.shelter_unit_id"]
+                    unit = lambda row: unit_repr
+                    last_seen_on_repr = case["dvr_case.last_seen_on"]
+                    last_seen_on = lambda row: last_seen_on_repr
 
                     # TODO reinstate when fixed
                     #absence = lambda row: case["pr_person.absence"]
@@ -191,7 +196,6 @@ def dvr_rheader(r, tabs=None):
                 rheader = rheader(r, table=resource.table, record=record)
 
                 # Add profile picture
-                from core import s3_avatar_represent
                 record_id = record.id
                 rheader.insert(0, A(s3_avatar_represent(record_id,
                                                         "pr_person",
@@ -364,7 +368,6 @@ def hrm_rheader(r, tabs=None):
             rheader = rheader(r, table=resource.table, record=record)
 
             # Add profile picture
-            from core import s3_avatar_represent
             record_id = record.id
             rheader.insert(0, A(s3_avatar_represent(record_id,
                                                     "pr_person",
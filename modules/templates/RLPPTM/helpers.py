@@ -329,6 +329,7 @@ def is_org_group(organisation_id, group, cacheable=True):
         Args:
             organisation_id: the organisation ID
             group: the organisation group name
+            cacheable: allow the result to be cached
 
         Returns:
             boolean
@@ -336,6 +337,17 @@ def is_org_group(organisation_id, group, cacheable=True):
 
     s3db = current.s3db
 
+    if cacheable:
+        s3 = current.response.s3
+        groups = s3.rlpptm_org_groups
+        if groups is None:
+            groups = s3.rlpptm_org_groups = {}
+        key = (organisation_id, group)
+        if key in groups:
+            return groups[key]
+    else:
+        groups = None
+
     gtable = s3db.org_group
     mtable = s3db.org_group_membership
     join = [gtable.on((gtable.id == mtable.group_id) & \
@@ -344,11 +356,16 @@ def is_org_group(organisation_id, group, cacheable=True):
     query = (mtable.organisation_id == organisation_id) & \
             (mtable.deleted == False)
     row = current.db(query).select(mtable.id,
-                                   cache = s3db.cache,
+                                   cache = s3db.cache if cacheable else None,
                                    join = join,
                                    limitby = (0, 1),
                                    ).first()
-    return bool(row)
+    result = bool(row)
+
+    if groups is not None:
+        groups[key] = result
+
+    return result
 
 # -----------------------------------------------------------------------------
 def is_org_type_tag(organisation_id, tag, value=None):
@@ -604,11 +621,16 @@ def assign_pending_invoices(billing_id, organisation_id=None, invoice_id=None):
 
         # Re-assign invoices
         # - try to distribute workload evenly among the accountants
+        assign = {}
         for invoice in invoices:
             hr_id, num = min(workload.items(), key=lambda item: item[1])
-            invoice.update_record(human_resource_id = hr_id)
+            assign.setdefault(hr_id, []).append(invoice.id)
             workload[hr_id] = num + 1
 
+        # Update all invoices assigned to the same accountant at once
+        for hr_id, invoice_ids in assign.items():
+            db(itable.id.belongs(invoice_ids)).update(human_resource_id = hr_id)
+
     elif not invoice_id:
         # Unassign all pending invoices
         db(query).update(human_resource_id = None)
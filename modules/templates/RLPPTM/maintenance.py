@@ -287,7 +287,7 @@ class Daily():
         """
 
         from .config import TESTSTATIONS
-        from .models.org import TestProvider
+        from .models.org import TestProvider, TestStation
 
         db = current.db
         s3db = current.s3db
@@ -305,17 +305,25 @@ class Daily():
                          (mtable.deleted == False)
                          )
 
-        query = (ctable.status in ("CURRENT", "SUSPENDED")) & \
+        query = (ctable.status.belongs(("CURRENT", "SUSPENDED"))) & \
                 (ctable.end_date != None) & \
                 (ctable.end_date < today) & \
                 (ctable.deleted == False)
-        rows = db(query).select(ctable.id,
-                                ctable.status,
-                                ctable.organisation_id,
+        rows = db(query).select(ctable.organisation_id,
                                 join = join,
+                                distinct = True,
                                 )
+
+        # Expire all commissions of each organisation in one go
+        delist = []
         for row in rows:
-            TestProvider(row.organisation_id).expire_commission()
+            organisation_id = row.organisation_id
+            if TestProvider(organisation_id).expire_commission(delist=False):
+                delist.append(organisation_id)
+
+        # De-list the test stations of all affected organisations at once
+        if delist:
+            TestStation.update_all(delist, public="N", reason="COMMISSION")
 
     # -------------------------------------------------------------------------
     @staticmethod
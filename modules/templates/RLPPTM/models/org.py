@@ -32,7 +32,11 @@ __all__ = ("TestProviderRequirementsModel",
            )
 
 import datetime
+import hashlib
 import os
+import random
+
+from operator import itemgetter
 
 from gluon import current, Field, URL, IS_EMPTY_OR, IS_IN_SET, DIV
 from gluon.storage import Storage
@@ -123,6 +127,34 @@ EVIDENCE_STATUS = WorkflowOptions(("N/R", "Not Required", "grey"),
                                   represent = "status",
                                   )
 
+# Site approval tags subject to review
+SITE_REVIEW = ("hygiene", "layout")
+
+# Commission fields relevant for status updates in commission_onaccept
+COMMISSION_STATUS_FIELDS = {"organisation_id", "end_date", "status"}
+
+# Commission fields required for validation in commission_onvalidation
+COMMISSION_INTERVAL_FIELDS = ("organisation_id", "date", "end_date", "status")
+
+# Fields that constitute the current site approval status
+APPROVAL_STATUS_FIELDS = ("status",
+                          "hygiene",
+                          "layout",
+                          "public",
+                          "public_reason",
+                          "advice",
+                          )
+APPROVAL_HISTORY_FIELDS = ("id", "timestmp") + APPROVAL_STATUS_FIELDS
+
+# Extracts the tuple of approval status values from a Row
+approval_status_values = itemgetter(*APPROVAL_STATUS_FIELDS)
+
+# Facility location fields encoded in the verification hash
+SITE_LOCATION_FIELDS = ("id", "parent", "addr_street", "addr_postcode")
+
+# Characters for the random part of facility codes (no lookalikes)
+FACILITY_CODE_CHARS = "ABCFGHKLNPRSTWX12456789"
+
 # =============================================================================
 class TestProviderRequirementsModel(DataModel):
     """
@@ -200,6 +232,12 @@ class TestProviderModel(DataModel):
 
         crud_strings = current.response.s3.crud_strings
 
+        # Shared validator for org requirements
+        org_rqm_requires = IS_IN_SET(ORG_RQM.selectable(True),
+                                     sort = False,
+                                     zero = None,
+                                     )
+
         # ---------------------------------------------------------------------
         # Verification details
         #
@@ -227,10 +265,7 @@ class TestProviderModel(DataModel):
                      Field("orgtype",
                            label = T("Organization Type verification"),
                            default = "N/A",
-                           requires = IS_IN_SET(ORG_RQM.selectable(True),
-                                                sort = False,
-                                                zero = None,
-                                                ),
+                           requires = org_rqm_requires,
                            represent = ORG_RQM.represent,
                            readable = True,
                            writable = False,
@@ -239,10 +274,7 @@ class TestProviderModel(DataModel):
                      Field("mpav",
                            label = T("MPAV Qualification verification"),
                            default = "N/A",
-                           requires = IS_IN_SET(ORG_RQM.selectable(True),
-                                                sort = False,
-                                                zero = None,
-                                                ),
+                           requires = org_rqm_requires,
                            represent = ORG_RQM.represent,
                            readable = True,
                            writable = False,
@@ -303,7 +335,7 @@ class TestProviderModel(DataModel):
                                         IS_IN_SET(COMMISSION_REASON.selectable(True),
                                                   sort = False,
                                                   )),
-                           represent = represent_option(dict(COMMISSION_REASON.labels())),
+                           represent = represent_option(COMMISSION_REASON.lookup()),
                            ),
                      Field("cnote", "upload",
                            label = T("Commissioning Note"),
@@ -423,39 +455,49 @@ class TestProviderModel(DataModel):
         record_id = get_form_record_id(form)
         ctable = s3db.org_commission
 
-        # Get record data
         form_vars = form.vars
-        data = {}
-        load = []
-        for fn in ("organisation_id", "date", "end_date", "status"):
-            if fn in form_vars:
-                data[fn] = form_vars[fn]
+        errors = form.errors
+
+        active_statuses = ("CURRENT", "SUSPENDED")
+
+        # Get record data
+        original = form.record if hasattr(form, "record") else None
+        fields = COMMISSION_INTERVAL_FIELDS
+        data = {fn: form_vars[fn] for fn in fields if fn in form_vars}
+        if original and record_id:
+            data.update({fn: original[fn] for fn in fields
+                                          if fn not in data and fn in original})
+        load = [fn for fn in fields if fn not in data]
+        if load:
+            if record_id:
+                record = db(ctable.id == record_id).select(*load, limitby=(0, 1)).first()
+                data.update({fn: record[fn] for fn in load})
             else:
-                data[fn] = ctable[fn].default
-                load.append(fn)
-        if load and record_id:
-            record = db(ctable.id == record_id).select(*load, limitby=(0, 1)).first()
-            for fn in load:
-                data[fn] = record[fn]
+                data.update({fn: ctable[fn].default for fn in load})
 
         organisation_id = data["organisation_id"]
         start = data["date"]
         end = data["end_date"]
         status = data["status"]
 
-        if "end_date" in form_vars:
+        # Check whether the commission interval has changed
+        if original and record_id:
+            changed = any(data[fn] != original.get(fn) for fn in data)
+        else:
+            changed = True
+
+        if changed and "end_date" in form_vars:
             # End date must be after start date
             if start and end and end < start:
-                form.errors["end_date"] = T("End date must be after start date")
+                errors["end_date"] = T("End date must be after start date")
                 return
 
-        active_statuses = ("CURRENT", "SUSPENDED")
-
-        if status in active_statuses:
+        if changed and status in active_statuses:
             # Prevent overlapping active commissions
+            end_date = ctable.end_date
             query = (ctable.status.belongs(active_statuses)) & \
                     (ctable.organisation_id == organisation_id) & \
-                    ((ctable.end_date == None) | (ctable.end_date >= start))
+                    ((end_date == None) | (end_date >= start))
             if record_id:
                 query = (ctable.id != record_id) & query
             if end:
@@ -465,35 +507,35 @@ class TestProviderModel(DataModel):
             if row:
                 error = T("Date interval overlaps existing commission")
                 if "date" in form_vars:
-                    form.errors["date"] = error
+                    errors["date"] = error
                 if "end_date" in form_vars:
-                    form.errors["end_date"] = error
+                    errors["end_date"] = error
                 if "date" not in form_vars and "end_date" not in form_vars:
-                    form.errors["status"] = error
+                    errors["status"] = error
                 return
 
         if "status" in form_vars:
             # CURRENT only allowed when org verification valid
             if status == "CURRENT" and \
-               not TestProvider(organisation_id).verified:
-                form.errors["status"] = T("Organization not verified")
+               not TestProvider.get(organisation_id).verified:
+                errors["status"] = T("Organization not verified")
 
             # CURRENT/SUSPENDED only allowed before end date
             today = current.request.utcnow.date()
             if end and end < today and status in active_statuses:
-                form.errors["status"] = T("Invalid status past end date")
+                errors["status"] = T("Invalid status past end date")
                 return
 
             # SUSPENDED requires a reason
             reason = form_vars.get("status_reason") or ""
             if status == "SUSPENDED" and "status_reason" in form_vars and len(reason.strip()) < 3:
-                form.errors["status_reason"] = T("Reason required for suspended-status")
+                errors["status_reason"] = T("Reason required for suspended-status")
                 return
 
             # SUSPENDED with reason OVERRIDE requires comments
             comments = form_vars.get("comments") if "comments" in form_vars else True
             if status == "SUSPENDED" and reason == "OVERRIDE" and not comments:
-                form.errors["comments"] = T("More details required")
+                errors["comments"] = T("More details required")
 
     #--------------------------------------------------------------------------
     @staticmethod
@@ -512,6 +554,17 @@ class TestProviderModel(DataModel):
         if not record_id:
             return
 
+        today = current.request.utcnow.date()
+
+        original = form.record if hasattr(form, "record") else None
+        if original:
+            # Commission has been updated => discard cached provider data
+            TestProvider.invalidate(original.get("organisation_id"))
+
+        # Skip if no status-relevant data have changed
+        if TestProviderModel.commission_unchanged(form.vars, original, today):
+            return
+
         db = current.db
         s3db = current.s3db
 
@@ -529,8 +582,7 @@ class TestProviderModel(DataModel):
         if not record:
             return
 
-        provider = TestProvider(record.organisation_id)
-        today = current.request.utcnow.date()
+        provider = TestProvider.get(record.organisation_id)
 
         update = {}
         if provider.verified:
@@ -553,6 +605,9 @@ class TestProviderModel(DataModel):
         if update:
             record.update_record(**update)
 
+        # Current commission of the provider may have changed
+        provider.reset_commission()
+
         # Issue commissioning note
         if record.status == "CURRENT" and not record.vhash:
             from ..commission import ProviderCommission
@@ -583,6 +638,56 @@ class TestProviderModel(DataModel):
                 current.response.information = \
                     T("Test station notified")
 
+    #--------------------------------------------------------------------------
+    @staticmethod
+    def commission_unchanged(form_vars, original, today):
+        """
+            Checks whether a commission update requires no further
+            processing in commission_onaccept
+
+            Args:
+                form_vars: the form vars
+                original: the record before the update (form.record)
+                today: the current date
+
+            Returns:
+                True if the update can be skipped, otherwise False
+        """
+
+        if not original:
+            # New record
+            return False
+
+        # Status-relevant fields changed?
+        for fn in COMMISSION_STATUS_FIELDS:
+            if fn in form_vars and form_vars[fn] != original.get(fn):
+                return False
+
+        status = original.get("status")
+        if not status or status != original.get("prev_status"):
+            return False
+
+        # Commission expired?
+        end_date = form_vars.get("end_date", original.get("end_date"))
+        if end_date and end_date < today:
+            return False
+
+        if status in ("CURRENT", "REVOKED", "EXPIRED"):
+            # Status reason must be removed?
+            if form_vars.get("status_reason", original.get("status_reason")):
+                return False
+
+        if status == "CURRENT":
+            # Commissioning note outstanding, or provider not verified?
+            if not original.get("vhash"):
+                return False
+            organisation_id = form_vars.get("organisation_id",
+                                            original.get("organisation_id"))
+            if not TestProvider.get(organisation_id).verified:
+                return False
+
+        return True
+
     #--------------------------------------------------------------------------
     @staticmethod
     def audit_onvalidation(form):
@@ -846,6 +951,15 @@ class TestStationModel(DataModel):
         crud_strings = current.response.s3.crud_strings
         css = "approval-workflow"
 
+        # Shared representation of public-reason
+        public_reason_represent = represent_option(PUBLIC_REASON.lookup())
+
+        # Shared validator for site requirements
+        site_rqm_requires = IS_IN_SET(SITE_RQM.selectable(True),
+                                      zero = None,
+                                      sort = False,
+                                      )
+
         # ---------------------------------------------------------------------
         # Current approval details
         #
@@ -874,10 +988,7 @@ class TestStationModel(DataModel):
                      Field("hygiene",
                            label = T("Hygiene Plan"),
                            default = "REVISE",
-                           requires = IS_IN_SET(SITE_RQM.selectable(True),
-                                                zero = None,
-                                                sort = False,
-                                                ),
+                           requires = site_rqm_requires,
                            represent = SITE_RQM.represent,
                            readable = True,
                            writable = False,
@@ -886,10 +997,7 @@ class TestStationModel(DataModel):
                      Field("layout",
                            label = T("Facility Layout Plan"),
                            default = "REVISE",
-                           requires = IS_IN_SET(SITE_RQM.selectable(True),
-                                                zero = None,
-                                                sort = False,
-                                                ),
+                           requires = site_rqm_requires,
                            represent = SITE_RQM.represent,
                            readable = True,
                            writable = False,
@@ -914,7 +1022,7 @@ class TestStationModel(DataModel):
                                                   sort = False,
                                                   zero = None,
                                                   )),
-                           represent = represent_option(dict(PUBLIC_REASON.labels())),
+                           represent = public_reason_represent,
                            readable = True,
                            writable = False,
                            ),
@@ -974,7 +1082,7 @@ class TestStationModel(DataModel):
                            ),
                      Field("public_reason",
                            label = T("Reason for unlisting"),
-                           represent = represent_option(dict(PUBLIC_REASON.labels())),
+                           represent = public_reason_represent,
                            readable = True,
                            writable = False,
                            ),
@@ -1021,13 +1129,7 @@ class TestStationModel(DataModel):
             The fields that constitute the current approval status
         """
 
-        return ("status",
-                "hygiene",
-                "layout",
-                "public",
-                "public_reason",
-                "advice",
-                )
+        return APPROVAL_STATUS_FIELDS
 
     # -------------------------------------------------------------------------
     @staticmethod
@@ -1047,8 +1149,8 @@ class TestStationModel(DataModel):
             form.errors["advice"] = current.T("More details required")
 
     # -------------------------------------------------------------------------
-    @classmethod
-    def site_approval_onaccept(cls, form):
+    @staticmethod
+    def site_approval_onaccept(form):
         """
             Onaccept of site approval:
                 - set public_reason if missing
@@ -1063,14 +1165,16 @@ class TestStationModel(DataModel):
         if not record_id:
             return
 
-        status_fields = cls.site_approval_status_fields()
-
-        # Re-read record
         atable = s3db.org_site_approval
+
+        # Re-read the record
         query = (atable.id == record_id) & \
                 (atable.deleted == False)
-        fields = [atable[fn] for fn in (("id", "organisation_id", "site_id") + status_fields)]
-        record = db(query).select(*fields, limitby=(0, 1)).first()
+        record = db(query).select(atable.organisation_id,
+                                  atable.site_id,
+                                  atable.public,
+                                  limitby = (0, 1),
+                                  ).first()
         if not record:
             return
 
@@ -1083,12 +1187,12 @@ class TestStationModel(DataModel):
             update["public_reason"] = None
 
         # Set organisation_id if missing
-        ts = TestStation(record.site_id)
-        if record.organisation_id != ts.organisation_id:
-            update["organisation_id"] = ts.organisation_id
+        organisation_id = TestStation.lookup_organisation(record.site_id)
+        if record.organisation_id != organisation_id:
+            update["organisation_id"] = organisation_id
 
         if update:
-            record.update_record(**update)
+            db(atable.id == record_id).update(**update)
 
 # =============================================================================
 class TestProvider:
@@ -1109,6 +1213,53 @@ class TestProvider:
         self._commission = None
 
         self._types = None
+        self._requirements = None
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def get(cls, organisation_id):
+        """
+            Returns the instance for an organisation from the request
+            cache, so that repeated checks (e.g. in prep, onvalidation
+            and onaccept of the same request) can reuse the lookups
+
+            Args:
+                organisation_id: the org_organisation record ID
+
+            Returns:
+                TestProvider instance
+        """
+
+        s3 = current.response.s3
+
+        providers = s3.rlpptm_test_providers
+        if providers is None:
+            providers = s3.rlpptm_test_providers = {}
+
+        provider = providers.get(organisation_id)
+        if provider is None:
+            provider = providers[organisation_id] = cls(organisation_id)
+
+        return provider
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def invalidate(organisation_id, instance=None):
+        """
+            Removes the cached instance for an organisation from the
+            request cache (e.g. after updating the verification status
+            through another instance)
+
+            Args:
+                organisation_id: the org_organisation record ID
+                instance: the instance performing the update (will
+                          be retained if it is the cached instance)
+        """
+
+        providers = current.response.s3.rlpptm_test_providers
+        if providers and organisation_id in providers:
+            if providers[organisation_id] is not instance:
+                del providers[organisation_id]
 
     # -------------------------------------------------------------------------
     # Instance properties
@@ -1214,8 +1365,6 @@ class TestProvider:
         types = self._types
         if types is None:
 
-            types = {}
-
             db = current.db
             s3db = current.s3db
 
@@ -1235,23 +1384,41 @@ class TestProvider:
                                     left=left,
                                     )
 
-            # Default provider requirements
-            defaults = Storage(commercial = False,
-                               rinforeq = False,
-                               verifreq = False,
-                               mpavreq = True,
-                               )
+            types = self._types = self.extract_types(rows)
 
-            for row in rows:
-                requirements = row[rtable]
-                if requirements.id:
-                    types[row[ltable].organisation_type_id] = requirements
-                else:
-                    types[row[ltable].organisation_type_id] = defaults
+        return types
 
-            self._types = types
+    # -------------------------------------------------------------------------
+    @property
+    def requirements(self):
+        """
+            The combined requirements of all types of this provider
 
-        return types
+            Returns:
+                Storage {commercial, verifreq, mpavreq, rinforeq}
+        """
+
+        types = self.types
+
+        # Cache as tuple (types, requirements), so that the
+        # requirements are re-computed when types are reloaded
+        cached = self._requirements
+        if cached is None or cached[0] is not types:
+            requirements = Storage(commercial = False,
+                                   verifreq = False,
+                                   mpavreq = False,
+                                   rinforeq = False,
+                                   )
+            keys = list(requirements.keys())
+            for rqm in types.values():
+                for key in keys:
+                    if rqm[key]:
+                        requirements[key] = True
+            self._requirements = (types, requirements)
+        else:
+            requirements = cached[1]
+
+        return requirements
 
     # -------------------------------------------------------------------------
     @property
@@ -1263,8 +1430,7 @@ class TestProvider:
                 bool
         """
 
-        types = self.types
-        return any(types[t].commercial for t in types)
+        return self.requirements.commercial
 
     # -------------------------------------------------------------------------
     @property
@@ -1276,8 +1442,7 @@ class TestProvider:
                 bool
         """
 
-        types = self.types
-        return any(types[t].verifreq for t in types)
+        return self.requirements.verifreq
 
     # -------------------------------------------------------------------------
     @property
@@ -1289,8 +1454,7 @@ class TestProvider:
                 bool
         """
 
-        types = self.types
-        return any(types[t].mpavreq for t in types)
+        return self.requirements.mpavreq
 
     # -------------------------------------------------------------------------
     @property
@@ -1302,11 +1466,109 @@ class TestProvider:
                 bool
         """
 
-        types = self.types
-        return any(types[t].rinforeq for t in types)
+        return self.requirements.rinforeq
 
     # -------------------------------------------------------------------------
     # Instance methods
+    # -------------------------------------------------------------------------
+    def reset_commission(self):
+        """
+            Discards the current commission of this provider, so that
+            it is looked up again when next accessed (e.g. after updating
+            commission statuses); also removes any other instance for the
+            same organisation from the request cache
+        """
+
+        self._commission = None
+        self.invalidate(self.organisation_id, self)
+
+    # -------------------------------------------------------------------------
+    def preload(self):
+        """
+            Looks up organisation record, verification status and types
+            of this provider in a single query, for subsequent access
+            through the respective properties
+        """
+
+        if self._record and self._verification and self._types is not None:
+            return
+
+        db = current.db
+        s3db = current.s3db
+
+        otable = s3db.org_organisation
+        vtable = s3db.org_verification
+        ltable = s3db.org_organisation_organisation_type
+        rtable = s3db.org_requirements
+
+        left = [vtable.on((vtable.organisation_id == otable.id) & \
+                          (vtable.deleted == False)),
+                ltable.on((ltable.organisation_id == otable.id) & \
+                          (ltable.deleted == False)),
+                rtable.on((rtable.organisation_type_id == ltable.organisation_type_id) & \
+                          (rtable.deleted == False)),
+                ]
+        query = (otable.id == self.organisation_id) & \
+                (otable.deleted == False)
+        rows = db(query).select(otable.id,
+                                otable.name,
+                                vtable.id,
+                                vtable.dhash,
+                                vtable.status,
+                                vtable.orgtype,
+                                vtable.mpav,
+                                vtable.reprinfo,
+                                ltable.organisation_type_id,
+                                rtable.id,
+                                rtable.commercial,
+                                rtable.rinforeq,
+                                rtable.mpavreq,
+                                rtable.verifreq,
+                                left = left,
+                                )
+        if not rows:
+            return
+
+        first = rows.first()
+        self._record = first[otable]
+
+        verification = first[vtable]
+        if verification.id:
+            self._verification = verification
+
+        self._types = self.extract_types(row for row in rows
+                                            if row[ltable].organisation_type_id)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def extract_types(rows):
+        """
+            Extracts the organisation types and corresponding requirements
+            from rows of an org_organisation_organisation_type query with
+            left join of org_requirements
+
+            Args:
+                rows: the rows
+
+            Returns:
+                dict {type_id: requirements}
+        """
+
+        # Default provider requirements
+        defaults = Storage(commercial = False,
+                           rinforeq = False,
+                           verifreq = False,
+                           mpavreq = True,
+                           )
+
+        types = {}
+        for row in rows:
+            requirements = row.org_requirements
+            type_id = row.org_organisation_organisation_type.organisation_type_id
+            types[type_id] = requirements if requirements.id else defaults
+
+        return types
+
     # -------------------------------------------------------------------------
     def lookup_verification(self, query=None):
         """
@@ -1434,8 +1696,9 @@ class TestProvider:
                 try:
                     uid = int(org.uuid[9:14], 16)
                 except (TypeError, ValueError):
+                    # First 5 hex digits of a random UUID
                     import uuid
-                    uid = int(uuid.uuid4().urn[9:14], 16)
+                    uid = uuid.uuid4().int >> 108
                 value = "%06d%04d" % (uid, org.id)
                 ttable.insert(organisation_id = org.id,
                               tag = "OrgID",
@@ -1464,7 +1727,16 @@ class TestProvider:
         record_id = table.insert(**data)
         current.auth.s3_set_record_owner(table, record_id)
 
-        return self.lookup_verification(table.id == record_id)
+        # Other instances must not add defaults again
+        self.invalidate(self.organisation_id, self)
+
+        # Build the verification record from the inserted data
+        # rather than reading it back from the database
+        verification = Storage(data)
+        verification.id = record_id
+        verification.dhash = None
+
+        return verification
 
     # -------------------------------------------------------------------------
     def vhash(self):
@@ -1543,14 +1815,16 @@ class TestProvider:
                          (htable.status == 1) & \
                          (htable.deleted == False))
 
-        query = (rtable.organisation_id == self.organisation_id)
-        rows = db(query).select(rtable.status, join=join)
+        query = (rtable.organisation_id == self.organisation_id) & \
+                (rtable.deleted == False)
+        rows = db(query).select(rtable.status, join=join, distinct=True)
 
-        if not rows:
+        statuses = {row.status for row in rows}
+        if not statuses:
             return "N/A"
-        elif any(row.status == "APPROVED" for row in rows):
+        elif "APPROVED" in statuses:
             return "VERIFIED"
-        elif any(row.status == "REVIEW" for row in rows):
+        elif "REVIEW" in statuses:
             return "REVIEW"
         else:
             return "REVISE"
@@ -1565,6 +1839,7 @@ class TestProvider:
                 - org type tags regarding verification requirements
         """
 
+        self.preload()
         verification = self.verification
 
         update, vhash = self.vhash()
@@ -1613,7 +1888,10 @@ class TestProvider:
                 update["status"] = status
 
         if update:
-            verification.update_record(**update)
+            table = current.s3db.org_verification
+            current.db(table.id == verification.id).update(**update)
+            verification.update(update)
+            self.invalidate(self.organisation_id, self)
 
         if status == "COMPLETE":
             info, warn = self.reinstate_commission("N/V")
@@ -1667,6 +1945,9 @@ class TestProvider:
                 info = T("Commission suspended")
                 warn = T("Test station could not be notified: %(error)s") % {"error": msg}
 
+            self.reset_commission()
+
+        # De-list all test stations
         TestStation.update_all(self.organisation_id,
                                public = "N",
                                reason = "SUSPENDED",
@@ -1731,7 +2012,7 @@ class TestProvider:
                 info = T("Commission reinstated")
                 warn = T("Test station could not be notified: %(error)s") % {"error": msg}
 
-        self._commission = None
+        self.reset_commission()
 
         if self.current_commission:
             TestStation.update_all(self.organisation_id,
@@ -1742,10 +2023,20 @@ class TestProvider:
         return info, warn
 
     # -------------------------------------------------------------------------
-    def expire_commission(self):
+    def expire_commission(self, delist=True):
         """
             Deactivate all current/suspended commissions of this provider
             which have expired
+
+            Args:
+                delist: de-list all test stations of the provider if
+                        it has no current commission any more; can be
+                        set to False to let the caller update the test
+                        stations of multiple providers in one go
+
+            Returns:
+                True if the test stations of the provider are to be
+                de-listed, otherwise False
         """
 
         db = current.db
@@ -1764,6 +2055,7 @@ class TestProvider:
                                 table.status,
                                 )
         commission_ids = [row.id for row in rows]
+        expired = False
         if commission_ids:
             # Mark them as expired
             query = (table.id.belongs(commission_ids))
@@ -1775,16 +2067,20 @@ class TestProvider:
 
             # If there is no current commission, de-list all test stations
             # and notify the organisation
-            self._commission = None
+            self.reset_commission()
             if not self.current_commission:
-                TestStation.update_all(self.organisation_id,
-                                       public = "N",
-                                       reason = "COMMISSION",
-                                       )
+                expired = True
+                if delist:
+                    TestStation.update_all(self.organisation_id,
+                                           public = "N",
+                                           reason = "COMMISSION",
+                                           )
                 self.notify_commission_change(status = "EXPIRED",
                                               commission_ids = commission_ids,
                                               )
 
+        return expired
+
     # -------------------------------------------------------------------------
     def notify_commission_change(self,
                                  status = None,
@@ -1847,44 +2143,41 @@ class TestProvider:
         if not template:
             template = "CommissionStatusChanged"
 
-        reason_labels = dict(COMMISSION_REASON.labels())
+        reason_labels = COMMISSION_REASON.lookup()
 
         db = current.db
         s3db = current.s3db
 
         table = s3db.org_commission
 
-        error = "No commission found"
-        for commission_id in commission_ids:
-
-            # Get the commission record
-            query = (table.id == commission_id)
-            commission = db(query).select(table.id,
-                                          table.date,
-                                          table.end_date,
-                                          table.status_date,
-                                          table.status_reason,
-                                          table.comments,
-                                          limitby = (0, 1),
-                                          ).first()
+        # Get all commission records
+        query = (table.id.belongs(commission_ids))
+        commissions = db(query).select(table.id,
+                                       table.date,
+                                       table.end_date,
+                                       table.status_date,
+                                       table.status_reason,
+                                       table.comments,
+                                       )
+
+        explanations = {}
 
-            if not commission:
-                continue
+        error = "No commission found"
+        for commission in commissions:
 
-            if not reason:
-                reason = commission.status_reason
-            if reason:
+            status_reason = reason or commission.status_reason
+            if status_reason:
                 requirements = {"N/V": "TestProviderRequirements",
-                                }.get(reason)
-                reason = reason_labels.get(reason)
+                                }.get(status_reason)
+                status_reason = reason_labels.get(status_reason)
             else:
                 requirements = None
-                reason = "-"
+                status_reason = "-"
 
             data = {"start": table.date.represent(commission.date),
                     "end": table.end_date.represent(commission.end_date),
                     "status_date": table.status_date.represent(commission.status_date),
-                    "reason": reason,
+                    "reason": status_reason,
                     "comments": commission.comments,
                     "explanation": "",
                     }
@@ -1892,20 +2185,24 @@ class TestProvider:
 
             # Add a requirements hint, if available
             if requirements:
-                ctable = s3db.cms_post
-                ltable = s3db.cms_post_module
-                join = ltable.on((ltable.post_id == ctable.id) & \
-                                 (ltable.module == "org") & \
-                                 (ltable.resource == "commission") & \
-                                 (ltable.deleted == False))
-                query = (ctable.name == requirements) & \
-                        (ctable.deleted == False)
-                row = db(query).select(ctable.body,
-                                       join = join,
-                                       limitby = (0, 1),
-                                       ).first()
-                if row:
-                    data["explanation"] = row.body
+                if requirements in explanations:
+                    explanation = explanations[requirements]
+                else:
+                    ctable = s3db.cms_post
+                    ltable = s3db.cms_post_module
+                    join = ltable.on((ltable.post_id == ctable.id) & \
+                                     (ltable.module == "org") & \
+                                     (ltable.resource == "commission") & \
+                                     (ltable.deleted == False))
+                    query = (ctable.name == requirements) & \
+                            (ctable.deleted == False)
+                    row = db(query).select(ctable.body,
+                                           join = join,
+                                           limitby = (0, 1),
+                                           ).first()
+                    explanation = explanations[requirements] = row.body if row else None
+                if explanation:
+                    data["explanation"] = explanation
 
             error = CMSNotifications.send(email,
                                           template,
@@ -2005,7 +2302,8 @@ class TestProvider:
         if record_id:
             is_approver = role == "approver"
 
-            provider = cls(record_id)
+            provider = cls.get(record_id)
+            provider.preload()
 
             # Overall status
             field = table.status
@@ -2086,7 +2384,7 @@ class TestProvider:
 
             # Has the provider verification been accepted?
             if record_id:
-                accepted = TestProvider(record_id).verified
+                accepted = TestProvider.get(record_id).verified
             else:
                 accepted = False
 
@@ -2403,17 +2701,25 @@ class ProviderRepresentative:
         db = current.db
         s3db = current.s3db
 
-        # Get the person record
+        # Get the person record and details
         ptable = s3db.pr_person
+        dtable = s3db.pr_person_details
+        left = dtable.on((dtable.person_id == ptable.id) & \
+                         (dtable.deleted == False))
         query = (ptable.id == person_id) & (ptable.deleted == False)
         row = db(query).select(ptable.first_name,
                                ptable.last_name,
                                ptable.date_of_birth,
+                               dtable.place_of_birth,
+                               left = left,
                                limitby = (0, 1),
                                ).first()
         if not row:
             return False, s3_str(T("record not found"))
 
+        details = row.pr_person_details
+        row = row.pr_person
+
         # Validate details
         acceptable = True
         missing = []
@@ -2426,12 +2732,7 @@ class ProviderRepresentative:
             acceptable = False
             append(T("date of birth"))
 
-        dtable = s3db.pr_person_details
-        query = (dtable.person_id == person_id) & (dtable.deleted == False)
-        row = db(query).select(dtable.place_of_birth,
-                               limitby = (0, 1),
-                               ).first()
-        if not row or not row.place_of_birth:
+        if not details.place_of_birth:
             if cls.place_of_birth_required:
                 acceptable = False
             append(T("place of birth"))
@@ -2466,27 +2767,30 @@ class ProviderRepresentative:
 
         join = ptable.on(ptable.pe_id == ctable.pe_id)
 
-        phone = email = True
         missing = []
         append = missing.append
 
-        # Check email address
+        # Look up which types of contact details are available
+        phone_methods = ("SMS", "HOME_PHONE", "WORK_PHONE")
         query = (ptable.id == person_id) & \
-                (ctable.contact_method == "EMAIL") & \
+                (ctable.contact_method.belongs(("EMAIL",) + phone_methods)) & \
                 (ctable.value != None) & \
                 (ctable.deleted == False)
-        if not db(query).select(ctable.id, join=join, limitby=(0, 1)).first():
+        rows = db(query).select(ctable.contact_method,
+                                join = join,
+                                distinct = True,
+                                )
+        methods = {row.contact_method for row in rows}
+
+        # Check email address
+        email = "EMAIL" in methods
+        if not email:
             append(T("email address"))
-            email = False
 
         # Check phone number
-        query = (ptable.id == person_id) & \
-                (ctable.contact_method.belongs("SMS", "HOME_PHONE", "WORK_PHONE")) & \
-                (ctable.value != None) & \
-                (ctable.deleted == False)
-        if not db(query).select(ctable.id, join=join, limitby=(0, 1)).first():
+        phone = any(method in methods for method in phone_methods)
+        if not phone:
             append(T("phone number"))
-            phone = False
 
         # At least one contact detail must be provided,
         # as well as any required detail
@@ -2783,6 +3087,7 @@ class TestStation:
         """
 
         self._approval = None
+        self._location = None
 
         if site_id:
             self._site_id = site_id
@@ -2855,29 +3160,85 @@ class TestStation:
 
         record = self._record
         if not record:
-            table = current.s3db.org_facility
+            s3db = current.s3db
+
+            table = s3db.org_facility
+            ltable = s3db.gis_location
+            atable = s3db.org_site_approval
+
             site_id, facility_id = self._site_id, self._facility_id
             if site_id:
                 query = (table.site_id == site_id)
             else:
                 query = (table.id == facility_id)
             query &= (table.deleted == False)
-            record = current.db(query).select(table.id,
-                                              table.uuid,
-                                              table.code,
-                                              table.name,
-                                              table.site_id,
-                                              table.organisation_id,
-                                              table.location_id,
-                                              limitby = (0, 1),
-                                              ).first()
-            if record:
-                self._record = record
+
+            # Look up location and approval status in the same query
+            left = [ltable.on((ltable.id == table.location_id) & \
+                              (ltable.deleted == False)),
+                    atable.on((atable.site_id == table.site_id) & \
+                              (atable.deleted == False)),
+                    ]
+            fields = [table.id,
+                      table.uuid,
+                      table.code,
+                      table.name,
+                      table.site_id,
+                      table.organisation_id,
+                      table.location_id,
+                      atable.id,
+                      atable.dhash,
+                      ]
+            fields.extend(ltable[fn] for fn in SITE_LOCATION_FIELDS)
+            fields.extend(atable[fn] for fn in APPROVAL_STATUS_FIELDS)
+            row = current.db(query).select(*fields,
+                                           left = left,
+                                           limitby = (0, 1),
+                                           ).first()
+            if row:
+                record = self._record = row.org_facility
                 self._facility_id = record.id
                 self._site_id = record.site_id
 
+                location = row.gis_location
+                if location.id:
+                    self._location = location
+
+                approval = row.org_site_approval
+                if approval.id and not self._approval:
+                    self._approval = approval
+            else:
+                record = None
+
         return record
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def lookup_organisation(site_id):
+        """
+            Looks up the organisation a test station belongs to, with
+            request cache
+
+            Args:
+                site_id: the site ID
+
+            Returns:
+                the organisation record ID
+        """
+
+        s3 = current.response.s3
+
+        organisations = s3.rlpptm_site_organisations
+        if organisations is None:
+            organisations = s3.rlpptm_site_organisations = {}
+
+        if site_id in organisations:
+            organisation_id = organisations[site_id]
+        else:
+            organisation_id = organisations[site_id] = TestStation(site_id).organisation_id
+
+        return organisation_id
+
     # -------------------------------------------------------------------------
     @property
     def approval(self):
@@ -2994,12 +3355,12 @@ class TestStation:
         try:
             uid = int(facility.uuid[9:14], 16) % 1000000
         except (TypeError, ValueError):
+            # First 5 hex digits of a random UUID
             import uuid
-            uid = int(uuid.uuid4().urn[9:14], 16) % 1000000
+            uid = (uuid.uuid4().int >> 108) % 1000000
 
         # Generate code
-        import random
-        suffix = "".join(random.choice("ABCFGHKLNPRSTWX12456789") for _ in range(3))
+        suffix = "".join(random.choices(FACILITY_CODE_CHARS, k=3))
         code = "%06d-%s" % (uid, suffix)
 
         facility.update_record(code=code)
@@ -3029,26 +3390,23 @@ class TestStation:
         db = current.db
         s3db = current.s3db
 
+        # Load the record first (also pre-loads location and approval)
+        record = self.record
         approval = self.approval
 
         # Extract the location, and compute the hash
-        ltable = s3db.gis_location
-        query = (ltable.id == self.record.location_id) & \
-                (ltable.deleted == False)
-        location = db(query).select(ltable.id,
-                                    ltable.parent,
-                                    ltable.addr_street,
-                                    ltable.addr_postcode,
-                                    limitby = (0, 1),
-                                    ).first()
+        location = self._location
+        if not location:
+            ltable = s3db.gis_location
+            query = (ltable.id == record.location_id) & \
+                    (ltable.deleted == False)
+            location = db(query).select(*(ltable[fn] for fn in SITE_LOCATION_FIELDS),
+                                        limitby = (0, 1),
+                                        ).first()
         if location:
-            vhash = get_dhash(location.id,
-                              location.parent,
-                              location.addr_street,
-                              location.addr_postcode,
-                              )
+            vhash = get_dhash(*(location[fn] for fn in SITE_LOCATION_FIELDS))
         else:
-            vhash = get_dhash(None, None, None, None)
+            vhash = get_dhash(*(None for fn in SITE_LOCATION_FIELDS))
 
         # Check against the current dhash
         dhash = approval.dhash
@@ -3091,17 +3449,17 @@ class TestStation:
         tags = self.approval
         update, notify = {}, False
 
-        SITE_REVIEW = ("hygiene", "layout")
-        all_tags = lambda v: all(tags[k] == v for k in SITE_REVIEW)
-        any_tags = lambda v: any(tags[k] == v for k in SITE_REVIEW)
+        # The set of current review tag values
+        values = {tags[k] for k in SITE_REVIEW}
+        approved = values == {"APPROVED"}
 
         status = tags.status
         if status == "REVISE":
-            if all_tags("APPROVED"):
+            if approved:
                 update["public"] = "Y"
                 update["status"] = "APPROVED"
                 notify = True
-            elif any_tags("REVIEW"):
+            elif "REVIEW" in values:
                 update["public"] = "N"
                 update["status"] = "REVIEW"
             else:
@@ -3110,7 +3468,7 @@ class TestStation:
 
         elif status == "READY":
             update["public"] = "N"
-            if all_tags("APPROVED"):
+            if approved:
                 for k in SITE_REVIEW:
                     update[k] = "REVIEW"
             else:
@@ -3120,23 +3478,23 @@ class TestStation:
             update["status"] = "REVIEW"
 
         elif status == "REVIEW":
-            if all_tags("APPROVED"):
+            if approved:
                 update["public"] = "Y"
                 update["status"] = "APPROVED"
                 notify = True
-            elif any_tags("REVIEW"):
+            elif "REVIEW" in values:
                 update["public"] = "N"
                 # Keep status REVIEW
-            elif any_tags("REVISE"):
+            elif "REVISE" in values:
                 update["public"] = "N"
                 update["status"] = "REVISE"
                 notify = True
 
         elif status == "APPROVED":
-            if any_tags("REVIEW"):
+            if "REVIEW" in values:
                 update["public"] = "N"
                 update["status"] = "REVIEW"
-            elif any_tags("REVISE"):
+            elif "REVISE" in values:
                 update["public"] = "N"
                 update["status"] = "REVISE"
                 notify = True
@@ -3160,7 +3518,7 @@ class TestStation:
         if commissioned is None:
             organisation_id = self.record.organisation_id
             if organisation_id:
-                commissioned = bool(TestProvider(organisation_id).current_commission)
+                commissioned = bool(TestProvider.get(organisation_id).current_commission)
 
         # Verify record integrity and compute the verification hash
         update, vhash = self.vhash()
@@ -3205,10 +3563,13 @@ class TestStation:
         status = update["status"] if "status" in update else approval.status
         update["dhash"] = vhash if status == "APPROVED" else None
 
-        # Update the record
+        # Update the record (only if anything changes)
+        update = {k: v for k, v in update.items() if approval[k] != v}
         if update:
             approval.update_record(**update)
-            self.update_approval_history()
+
+        # Update the history (the record may have been changed by a form)
+        self.update_approval_history()
 
         T = current.T
 
@@ -3246,23 +3607,23 @@ class TestStation:
         site_id = self.site_id
         approval = self.approval
 
-        htable = s3db.org_site_approval_status
-        status_fields = TestStationModel.site_approval_status_fields()
+        status_fields = APPROVAL_STATUS_FIELDS
 
         # Get last entry of history
         htable = s3db.org_site_approval_status
         query = (htable.site_id == site_id) & \
                 (htable.deleted == False)
-        fields = [htable[fn] for fn in (("id", "timestmp") + status_fields)]
+        fields = [htable[fn] for fn in APPROVAL_HISTORY_FIELDS]
         prev = db(query).select(*fields,
                                 limitby = (0, 1),
                                 orderby = ~htable.timestmp,
                                 ).first()
 
         # If status has changed...
-        if not prev or any(prev[fn] != approval[fn] for fn in status_fields):
+        values = approval_status_values(approval)
+        if not prev or approval_status_values(prev) != values:
 
-            update = {fn: approval[fn] for fn in status_fields}
+            update = dict(zip(status_fields, values))
             update["site_id"] = site_id
 
             # Update existing history entry or add a new one
@@ -3329,23 +3690,27 @@ class TestStation:
             review = (("hygiene", "FacilityHygienePlanRequirements"),
                       ("layout", "FacilityLayoutRequirements"),
                       )
-            ctable = s3db.cms_post
-            ltable = s3db.cms_post_module
-            join = ltable.on((ltable.post_id == ctable.id) & \
-                             (ltable.module == "org") & \
-                             (ltable.resource == "facility") & \
-                             (ltable.deleted == False))
-            explanations = []
-            for tag, requirements in review:
-                if approval[tag] == "REVISE":
-                    query = (ctable.name == requirements) & \
-                            (ctable.deleted == False)
-                    row = db(query).select(ctable.body,
-                                           join = join,
-                                           limitby = (0, 1),
-                                           ).first()
-                    if row:
-                        explanations.append(row.body)
+            revise = [requirements for tag, requirements in review
+                                   if approval[tag] == "REVISE"]
+            if revise:
+                ctable = s3db.cms_post
+                ltable = s3db.cms_post_module
+                join = ltable.on((ltable.post_id == ctable.id) & \
+                                 (ltable.module == "org") & \
+                                 (ltable.resource == "facility") & \
+                                 (ltable.deleted == False))
+                query = (ctable.name.belongs(revise)) & \
+                        (ctable.deleted == False)
+                rows = db(query).select(ctable.name,
+                                        ctable.body,
+                                        join = join,
+                                        )
+                bodies = {}
+                for row in rows:
+                    bodies.setdefault(row.name, row.body)
+                explanations = [bodies[name] for name in revise if name in bodies]
+            else:
+                explanations = None
             data["explanations"] = "\n\n".join(explanations) if explanations else "-"
 
         elif status == "APPROVED":
@@ -3382,7 +3747,8 @@ class TestStation:
             organisation, to be called when commission status changes
 
             Args:
-                organisation_id: the organisation ID
+                organisation_id: the organisation ID, or a list of
+                                 organisation IDs (bulk update)
                 public: the new public-status ("Y" or "N")
                 reason: the reason(s) for the "N"-status (code|list of codes)
 
@@ -3398,8 +3764,11 @@ class TestStation:
         db = current.db
 
         table = current.s3db.org_site_approval
-        query = (table.organisation_id == organisation_id) & \
-                (table.public != public)
+        if isinstance(organisation_id, (tuple, list, set)):
+            query = (table.organisation_id.belongs(organisation_id))
+        else:
+            query = (table.organisation_id == organisation_id)
+        query &= (table.public != public)
 
         if public == "Y":
             # Update only to "Y" if fully approved
@@ -3416,16 +3785,85 @@ class TestStation:
         query &= (table.deleted == False)
 
         rows = db(query).select(table.site_id)
+        if not rows:
+            return 0
 
         # Update the matching facilities
         num_updated = db(query).update(**update)
 
         # Update approval histories
-        for row in rows:
-            cls(row.site_id).update_approval_history()
+        cls.update_approval_histories({row.site_id for row in rows})
 
         return num_updated
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def update_approval_histories(site_ids):
+        """
+            Updates the approval histories of multiple test stations at
+            once, to be called after bulk updates of approval records
+
+            Args:
+                site_ids: the site IDs of the test stations
+        """
+
+        db = current.db
+        s3db = current.s3db
+
+        status_fields = APPROVAL_STATUS_FIELDS
+
+        # Get the current approval status of all sites
+        atable = s3db.org_site_approval
+        query = (atable.site_id.belongs(site_ids)) & \
+                (atable.deleted == False)
+        fields = [atable.site_id] + [atable[fn] for fn in status_fields]
+        approvals = db(query).select(*fields)
+
+        # Get the last history entry of all sites
+        # - i.e. those entries for which no newer entry exists
+        htable = s3db.org_site_approval_status
+        newer = htable.with_alias("newer_approval_status")
+        left = newer.on((newer.site_id == htable.site_id) & \
+                        (newer.timestmp > htable.timestmp) & \
+                        (newer.deleted == False))
+        query = (htable.site_id.belongs(site_ids)) & \
+                (htable.deleted == False) & \
+                (newer.id == None)
+        fields = [htable.site_id] + [htable[fn] for fn in APPROVAL_HISTORY_FIELDS]
+        rows = db(query).select(*fields, left=left)
+        history = {}
+        for row in rows:
+            if row.site_id not in history:
+                history[row.site_id] = row
+
+        timestmp = current.request.utcnow
+
+        entries, overwrite = [], {}
+        for approval in approvals:
+            site_id = approval.site_id
+            prev = history.get(site_id)
+
+            # If status has changed...
+            values = approval_status_values(approval)
+            if not prev or approval_status_values(prev) != values:
+
+                # Update existing history entry or add a new one
+                if prev and prev.timestmp == timestmp:
+                    overwrite.setdefault(values, []).append(prev.id)
+                else:
+                    entry = dict(zip(status_fields, values))
+                    entry["site_id"] = site_id
+                    entry["timestmp"] = timestmp
+                    entries.append(entry)
+
+        # Overwrite entries with the same timestamp, grouped by status
+        for values, record_ids in overwrite.items():
+            db(htable.id.belongs(record_ids)).update(**dict(zip(status_fields, values)))
+
+        # Add new entries
+        for entry in entries:
+            htable.insert(**entry)
+
     # -------------------------------------------------------------------------
     # Configuration helpers
     # -------------------------------------------------------------------------
@@ -3470,31 +3908,31 @@ class TestStation:
         ctable = component.table
 
         if record_id:
-            # Get the current approval status and public-tag
-            db = current.db
+            # Get the current approval status and public-tag, and
+            # whether the site has ever been approved, in one query
             s3db = current.s3db
             ftable = s3db.org_facility
             atable = s3db.org_site_approval
+            htable = s3db.org_site_approval_status
             join = ftable.on((ftable.site_id == atable.site_id) & \
                              (ftable.id == record_id))
+            left = htable.on((htable.site_id == atable.site_id) & \
+                             (htable.status.belongs("APPROVED", "REVIEW")) & \
+                             (htable.deleted == False))
             query = (atable.deleted == False)
-            row = db(query).select(atable.status,
-                                   atable.public,
-                                   atable.public_reason,
-                                   join = join,
-                                   limitby = (0, 1),
-                                   ).first()
-
-            # Has the site ever been approved?
-            htable = s3db.org_site_approval_status
-            join = ftable.on((ftable.site_id == htable.site_id) & \
-                             (ftable.id == record_id))
-            query = (htable.status.belongs("APPROVED", "REVIEW")) & \
-                    (htable.deleted == False)
-            applied_before = bool(db(query).select(htable.id,
-                                                   join = join,
-                                                   limitby = (0, 1),
-                                                   ).first())
+            row = current.db(query).select(atable.status,
+                                           atable.public,
+                                           atable.public_reason,
+                                           htable.id,
+                                           join = join,
+                                           left = left,
+                                           limitby = (0, 1),
+                                           ).first()
+            if row:
+                applied_before = bool(row.org_site_approval_status.id)
+                row = row.org_site_approval
+            else:
+                applied_before = False
         else:
             row = None
             applied_before = False
@@ -3588,9 +4026,9 @@ def get_dhash(*values):
             the verification hash as string
     """
 
-    import hashlib
     dstr = "#".join([str(v) if v else "***" for v in values])
 
-    return hashlib.sha256(dstr.encode("utf-8")).hexdigest().lower()
+    # hexdigest is always lowercase
+    return hashlib.sha256(dstr.encode("utf-8")).hexdigest()
 
 # END =========================================================================
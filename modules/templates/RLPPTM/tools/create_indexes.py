@@ -0,0 +1,90 @@
+# Create database indexes for RLPPTM (can be run repeatedly)
+#
+# Execute in web2py folder like:
+# python web2py.py -S eden -M -R applications/eden/modules/templates/RLPPTM/tools/create_indexes.py
+#
+import sys
+
+# Override auth (disables all permission checks)
+auth.override = True
+
+# Initialize failed-flag
+failed = False
+
+# Info
+def info(msg):
+    sys.stderr.write("%s" % msg)
+def infoln(msg):
+    sys.stderr.write("%s\n" % msg)
+
+# Load models for tables
+ctable = s3db.org_commission
+atable = s3db.org_site_approval
+htable = s3db.org_site_approval_status
+pctable = s3db.pr_contact
+
+# Indexes to create {index name: (table name, field names)}
+INDEXES = {
+    # Commission overlap check (commission_onvalidation)
+    "org_commission_overlap_idx": ("org_commission",
+                                   ("organisation_id", "status", "deleted", "end_date", "date"),
+                                   ),
+    # Current commission lookup (TestProvider.current_commission)
+    "org_commission_current_idx": ("org_commission",
+                                   ("organisation_id", "status", "deleted", "date DESC"),
+                                   ),
+    # Approval lookup by site (TestStation.lookup_approval)
+    "org_site_approval_site_idx": ("org_site_approval",
+                                   ("site_id", "deleted"),
+                                   ),
+    # Latest approval history entry per site (TestStation.update_approval_histories)
+    "org_site_approval_status_site_idx": ("org_site_approval_status",
+                                          ("site_id", "deleted", "timestmp"),
+                                          ),
+    # Contact details check (ProviderRepresentative.check_contact_data)
+    "pr_contact_method_idx": ("pr_contact",
+                              ("pe_id", "contact_method"),
+                              ),
+    }
+
+# -----------------------------------------------------------------------------
+# Create indexes
+#
+if not failed:
+    info("Create indexes")
+
+    dbtype = settings.get_database_type()
+    if dbtype in ("postgres", "sqlite"):
+        sql = "CREATE INDEX IF NOT EXISTS %(index)s ON %(table)s (%(fields)s);"
+
+        created = 0
+        for index, (tablename, fieldnames) in INDEXES.items():
+            names = {"index": index,
+                     "table": tablename,
+                     "fields": ",".join(fieldnames),
+                     }
+            try:
+                db.executesql(sql % names)
+            except Exception:
+                infoln("...failed")
+                infoln(sys.exc_info()[1])
+                failed = True
+                break
+            created += 1
+
+        if not failed:
+            infoln("...done (%s indexes)" % created)
+    else:
+        infoln("...skipped (not supported for %s)" % dbtype)
+
+# -----------------------------------------------------------------------------
+# Finishing up
+#
+if failed:
+    db.rollback()
+    infoln("UPGRADE FAILED - Action rolled back.")
+else:
+    db.commit()
+    infoln("UPGRADE SUCCESSFUL.")
+
+# END =========================================================================
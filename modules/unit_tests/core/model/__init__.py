@@ -1,3 +1,4 @@
 from .datamodel import *
 from .dynamic import *
 from .fields import *
+from .options import *
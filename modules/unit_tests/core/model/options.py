@@ -0,0 +1,107 @@
+# Eden unit tests
+#
+# To run this script use:
+# python web2py.py -S eden -M -R applications/eden/modules/unit_tests/core/model/options.py
+#
+import os
+import unittest
+
+from gluon import current
+from gluon.languages import translator
+
+from core import WorkflowOptions
+
+from unit_tests import run_suite
+
+# =============================================================================
+class WorkflowOptionsTests(unittest.TestCase):
+    """ Tests for WorkflowOptions """
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def options():
+        """ Produces a test option set """
+
+        return WorkflowOptions(("REVISE", "Revise", "red"),
+                               ("REVIEW", "Review", "amber"),
+                               ("APPROVED", "Approved", "green"),
+                               selectable = ("REVISE", "REVIEW"),
+                               )
+
+    # -------------------------------------------------------------------------
+    def testSelectable(self):
+        """ Selectable options are cached per set of values """
+
+        assertEqual = self.assertEqual
+
+        options = self.options()
+
+        selectable = options.selectable(True)
+        assertEqual([o[0] for o in selectable], ["REVISE", "REVIEW"])
+        self.assertIs(options.selectable(True), selectable)
+
+        selectable = options.selectable(True, current_value="APPROVED")
+        assertEqual([o[0] for o in selectable], ["REVISE", "REVIEW", "APPROVED"])
+
+        selectable = options.selectable()
+        assertEqual([o[0] for o in selectable], ["REVISE", "REVIEW", "APPROVED"])
+
+        # Cached options cannot be modified
+        self.assertIsInstance(selectable, tuple)
+        self.assertIsInstance(options.labels(), tuple)
+
+    # -------------------------------------------------------------------------
+    def testTranslatorChange(self):
+        """ Another translator gets its own labels, options and lookup """
+
+        assertIs = self.assertIs
+        assertIsNot = self.assertIsNot
+
+        options = self.options()
+
+        T = current.T
+        labels = options.labels()
+        lookup = options.lookup()
+        selectable = options.selectable(True)
+        assertIs(labels[0][1].T, T)
+
+        # Switch to another translator (as for another request)
+        langpath = os.path.join(current.request.folder, "languages")
+        T2 = translator(langpath, "de")
+        current.T = T2
+        try:
+            labels2 = options.labels()
+            lookup2 = options.lookup()
+            selectable2 = options.selectable(True)
+
+            assertIsNot(labels2, labels)
+            assertIsNot(lookup2, lookup)
+            assertIsNot(selectable2, selectable)
+
+            # All entries are bound to the new translator
+            for _, label in labels2:
+                assertIs(label.T, T2)
+            for label in lookup2.values():
+                assertIs(label.T, T2)
+            for _, label in selectable2:
+                assertIs(label.T, T2)
+
+            # Repeated calls hit the cache of the new translator
+            assertIs(options.labels(), labels2)
+            assertIs(options.lookup(), lookup2)
+            assertIs(options.selectable(True), selectable2)
+        finally:
+            current.T = T
+
+        # Back to the original translator
+        for _, label in options.labels():
+            assertIs(label.T, T)
+
+# =============================================================================
+if __name__ == "__main__":
+
+    run_suite(
+        WorkflowOptionsTests,
+    )
+
+# END ========================================================================
@@ -30,6 +30,7 @@ if __name__ == "__main__":
         "modules",
         "core",
         "s3db",
+        "templates",
     )
 
 # END ========================================================================
@@ -0,0 +1 @@
+from .rlpptm import *
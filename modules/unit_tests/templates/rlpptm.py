@@ -0,0 +1,288 @@
+# RLPPTM Template Unit Tests
+#
+# To run this script use:
+# python web2py.py -S eden -M -R applications/eden/modules/unit_tests/templates/rlpptm.py
+#
+import datetime
+import unittest
+
+from gluon import *
+from gluon.storage import Storage
+
+from templates.RLPPTM.models.org import APPROVAL_STATUS_FIELDS, \
+                                        TestProviderModel, \
+                                        TestStation
+
+from unit_tests import run_suite
+
+# =============================================================================
+class CommissionUnchangedTests(unittest.TestCase):
+    """ Tests for the commission_onaccept skip-check """
+
+    today = datetime.date(2026, 6, 15)
+
+    # -------------------------------------------------------------------------
+    def original(self, **values):
+        """ Produces a commission record before update """
+
+        record = {"organisation_id": 1,
+                  "date": datetime.date(2026, 1, 1),
+                  "end_date": None,
+                  "status": "SUSPENDED",
+                  "prev_status": "SUSPENDED",
+                  "status_reason": "N/V",
+                  "vhash": None,
+                  }
+        record.update(values)
+
+        return Storage(record)
+
+    # -------------------------------------------------------------------------
+    def testNewRecord(self):
+        """ New records are always processed """
+
+        unchanged = TestProviderModel.commission_unchanged
+
+        self.assertFalse(unchanged(Storage(status="SUSPENDED"), None, self.today))
+
+    # -------------------------------------------------------------------------
+    def testStatusChange(self):
+        """ Status changes are processed, updates without changes are not """
+
+        unchanged = TestProviderModel.commission_unchanged
+        original = self.original()
+
+        # Status changed in form
+        form_vars = Storage(status="REVOKED")
+        self.assertFalse(unchanged(form_vars, original, self.today))
+
+        # Status not changed in form
+        form_vars = Storage(status="SUSPENDED", status_reason="N/V")
+        self.assertTrue(unchanged(form_vars, original, self.today))
+
+        # Status not in form
+        form_vars = Storage(comments="Test")
+        self.assertTrue(unchanged(form_vars, original, self.today))
+
+        # Status changed by another process (differs from prev_status)
+        original = self.original(prev_status="CURRENT")
+        self.assertFalse(unchanged(form_vars, original, self.today))
+
+    # -------------------------------------------------------------------------
+    def testStatusReason(self):
+        """ Status reasons to be removed are detected from the effective value """
+
+        unchanged = TestProviderModel.commission_unchanged
+
+        # Stored status reason, field not in form => must be removed
+        original = self.original(status="REVOKED", prev_status="REVOKED")
+        form_vars = Storage(comments="Test")
+        self.assertFalse(unchanged(form_vars, original, self.today))
+
+        # Status reason removed through form default => nothing to remove
+        form_vars = Storage(status_reason=None)
+        self.assertTrue(unchanged(form_vars, original, self.today))
+
+        # Status reason set through form default => must be removed
+        original = self.original(status="REVOKED",
+                                 prev_status="REVOKED",
+                                 status_reason=None,
+                                 )
+        form_vars = Storage(status_reason="OVERRIDE")
+        self.assertFalse(unchanged(form_vars, original, self.today))
+
+        # Status reason retained for suspended commissions
+        original = self.original()
+        form_vars = Storage(status_reason="OVERRIDE")
+        self.assertTrue(unchanged(form_vars, original, self.today))
+
+    # -------------------------------------------------------------------------
+    def testDateChanges(self):
+        """ End date changes are processed, start date changes are not """
+
+        unchanged = TestProviderModel.commission_unchanged
+        original = self.original(end_date=datetime.date(2026, 12, 31))
+
+        # End date changed
+        form_vars = Storage(end_date=datetime.date(2026, 11, 30))
+        self.assertFalse(unchanged(form_vars, original, self.today))
+
+        # End date in the past
+        form_vars = Storage(end_date=datetime.date(2026, 6, 1))
+        self.assertFalse(unchanged(form_vars, original, self.today))
+
+        # Stored end date in the past
+        original = self.original(end_date=datetime.date(2026, 6, 1))
+        form_vars = Storage(comments="Test")
+        self.assertFalse(unchanged(form_vars, original, self.today))
+
+        # Only start date changed
+        original = self.original(end_date=datetime.date(2026, 12, 31))
+        form_vars = Storage(date=datetime.date(2026, 2, 1))
+        self.assertTrue(unchanged(form_vars, original, self.today))
+
+# =============================================================================
+@unittest.skipIf(not current.s3db.table("org_site_approval_status"),
+                 "RLPPTM models not configured")
+class ApprovalHistoryTests(unittest.TestCase):
+    """ Tests for bulk updates of test station approval histories """
+
+    APPROVED = {"status": "APPROVED",
+                "hygiene": "APPROVED",
+                "layout": "APPROVED",
+                "public": "Y",
+                "public_reason": None,
+                "advice": None,
+                }
+
+    REVIEW = {"status": "REVIEW",
+              "hygiene": "REVIEW",
+              "layout": "REVIEW",
+              "public": "N",
+              "public_reason": "REVIEW",
+              "advice": None,
+              }
+
+    REVISE = {"status": "REVISE",
+              "hygiene": "REVISE",
+              "layout": "APPROVED",
+              "public": "N",
+              "public_reason": "REVISE",
+              "advice": "Revise hygiene plan",
+              }
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        current.auth.override = True
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        current.db.rollback()
+        current.auth.override = False
+
+    # -------------------------------------------------------------------------
+    def create_sites(self):
+        """
+            Creates test stations with approval status and history
+
+            Returns:
+                list of site IDs
+        """
+
+        s3db = current.s3db
+
+        otable = s3db.org_organisation
+        ftable = s3db.org_facility
+        atable = s3db.org_site_approval
+        htable = s3db.org_site_approval_status
+
+        organisation_id = otable.insert(name="ApprovalHistoryTestOrg")
+
+        earlier = current.request.utcnow - datetime.timedelta(days=10)
+
+        APPROVED, REVIEW, REVISE = self.APPROVED, self.REVIEW, self.REVISE
+        sites = (# No history
+                 (APPROVED, []),
+                 # Latest history entry matches current status
+                 (REVIEW, [REVISE, REVIEW]),
+                 # Several history entries, latest differs from current status
+                 (APPROVED, [REVISE, REVIEW, REVISE]),
+                 )
+
+        site_ids = []
+        for index, (approval, history) in enumerate(sites):
+
+            facility = {"name": "ApprovalHistoryTestStation%s" % index,
+                        "organisation_id": organisation_id,
+                        }
+            facility["id"] = ftable.insert(**facility)
+            s3db.update_super(ftable, facility)
+            site_id = facility["site_id"]
+
+            atable.insert(organisation_id = organisation_id,
+                          site_id = site_id,
+                          **approval)
+
+            for days, entry in enumerate(history):
+                htable.insert(site_id = site_id,
+                              timestmp = earlier + datetime.timedelta(days=days),
+                              **entry)
+
+            site_ids.append(site_id)
+
+        return site_ids
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def get_histories(site_ids):
+        """
+            Extracts the approval histories of test stations
+
+            Args:
+                site_ids: the site IDs
+
+            Returns:
+                list of histories (lists of status value tuples), in
+                the same order as site_ids
+        """
+
+        htable = current.s3db.org_site_approval_status
+
+        query = (htable.site_id.belongs(site_ids)) & \
+                (htable.deleted == False)
+        rows = current.db(query).select(htable.site_id,
+                                        *[htable[fn] for fn in APPROVAL_STATUS_FIELDS],
+                                        orderby = (htable.timestmp, htable.id),
+                                        )
+        histories = {site_id: [] for site_id in site_ids}
+        for row in rows:
+            values = tuple(row[fn] for fn in APPROVAL_STATUS_FIELDS)
+            histories[row.site_id].append(values)
+
+        return [histories[site_id] for site_id in site_ids]
+
+    # -------------------------------------------------------------------------
+    def testBulkUpdate(self):
+        """ Bulk update produces the same histories as per-station updates """
+
+        assertEqual = self.assertEqual
+
+        # Update per station
+        site_ids = self.create_sites()
+        for site_id in site_ids:
+            TestStation(site_id).update_approval_history()
+        expected = self.get_histories(site_ids)
+
+        current.db.rollback()
+
+        # Bulk update
+        site_ids = self.create_sites()
+        TestStation.update_approval_histories(site_ids)
+        histories = self.get_histories(site_ids)
+
+        assertEqual(histories, expected)
+
+        # Verify the outcome
+        values = lambda entry: tuple(entry[fn] for fn in APPROVAL_STATUS_FIELDS)
+        APPROVED, REVIEW, REVISE = self.APPROVED, self.REVIEW, self.REVISE
+
+        no_history, matching, several = histories
+        assertEqual(no_history, [values(APPROVED)])
+        assertEqual(matching, [values(REVISE), values(REVIEW)])
+        assertEqual(several, [values(REVISE),
+                              values(REVIEW),
+                              values(REVISE),
+                              values(APPROVED),
+                              ])
+
+# =============================================================================
+if __name__ == "__main__":
+
+    run_suite(
+        CommissionUnchangedTests,
+        ApprovalHistoryTests,
+    )
+
+# END ========================================================================